@@ -1,22 +1,28 @@
 import os
-import tempfile
 from typing import List, Dict, Any, Optional
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
+from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 import json
 
 from document_processor import DocumentProcessor
 from vector_store import VectorStore
+from sharded_vector_store import ShardedVectorStore
 from query_parser import QueryParser
 from decision_engine import DecisionEngine
+from rule_engine import RuleEngine
+from index_snapshots import SnapshotStore, enqueue_document, INBOX_DIR
+from uploads import save_multipart_upload, UploadTooLarge, MAX_FIELD_BYTES
+from ingest_worker import ingest_document
 
 app = FastAPI(title="LLM Document Processing System")
 
 # Add this new model near the top with your other imports and models
 class QueryRequest(BaseModel):
     query: str
+    explain: Optional[bool] = None
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,9 +34,46 @@ app.add_middleware(
 
 # Initialize components
 document_processor = DocumentProcessor()
-vector_store = VectorStore()
+# "single": this process owns its own index. "serve": workers share the read-only
+# snapshots published by ingest_worker.py and queue uploads for it
+DEPLOY_MODE = os.getenv("DEPLOY_MODE", "single")
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "./snapshots")
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+
+store_kwargs = {
+    "index_type": os.getenv("INDEX_TYPE", "flat"),
+    "rescore_k": int(os.getenv("RESCORE_K", "0")),
+}
+if DEPLOY_MODE == "serve":
+    vector_store = SnapshotStore(
+        SNAPSHOT_DIR,
+        os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+        backend=os.getenv("EMBEDDING_BACKEND", "torch")
+    )
+elif int(os.getenv("SHARDS", "1")) > 1:
+    vector_store = ShardedVectorStore(
+        n_shards=int(os.getenv("SHARDS")),
+        partition=os.getenv("SHARD_PARTITION", "document"),
+        processes=os.getenv("SHARD_PROCESSES", "false").lower() == "true",
+        model_name=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+        backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+        **store_kwargs
+    )
+else:
+    vector_store = VectorStore(
+        os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+        backend=os.getenv("EMBEDDING_BACKEND", "torch"),
+        **store_kwargs
+    )
 query_parser = QueryParser()
-decision_engine = DecisionEngine()
+rule_engine = RuleEngine()
+# Content hash -> chunk count of every document ingested by this process
+ingested_documents = {}
+decision_engine = DecisionEngine(
+    mode=os.getenv("DECISION_MODE", "structured"),
+    context_encoder=vector_store.model,
+    context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "320"))
+)
 
 # Model for response
 class ProcessResponse(BaseModel):
@@ -38,43 +81,79 @@ class ProcessResponse(BaseModel):
     amount: Optional[float] = None
     justification: str
     clause_references: List[str]
+    confidence: Optional[float] = None
+    decision_source: Optional[str] = None
     structured_query: Dict[str, Any]
     relevant_clauses: List[Dict[str, Any]]
 
 @app.post("/upload_document")
-async def upload_document(file: UploadFile = File(...), metadata: str = Form("{}")):
-    """Upload and process a document"""
+async def upload_document(request: Request):
+    """Upload and process a document
+
+    Expects a multipart form with a "file" part and an optional "metadata" JSON field.
+    """
+    # Refuse bodies that announce they are too large before reading any of them
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + MAX_FIELD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the {MAX_UPLOAD_BYTES} byte limit")
+
+    try:
+        # Parse the body as it arrives: the file is written to a temporary file in
+        # received chunks, hashed and size-checked on the way, without being spooled first.
+        # In serve mode it lands next to the inbox, so queueing it is just a rename.
+        temp_file_path, content_hash, _, filename, fields = await save_multipart_upload(
+            request.stream(),
+            request.headers.get("content-type", ""),
+            directory=os.path.join(SNAPSHOT_DIR, INBOX_DIR, "incoming") if DEPLOY_MODE == "serve" else None,
+            max_bytes=MAX_UPLOAD_BYTES
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         # Parse metadata
-        meta_dict = json.loads(metadata)
-        
-        # Save the uploaded file to a temporary file
-        with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(file.filename)[1]) as temp_file:
-            temp_file.write(await file.read())
-            temp_file_path = temp_file.name
-        
-        try:
-            # Process the document
-            chunks = document_processor.process_document(temp_file_path)
-            
-            # Create metadata for each chunk
-            chunk_metadata = []
-            for i, chunk in enumerate(chunks):
-                chunk_meta = meta_dict.copy()
-                chunk_meta["document_name"] = file.filename
-                chunk_meta["chunk_id"] = i
-                chunk_metadata.append(chunk_meta)
-            
-            # Add to vector store
-            vector_store.add_documents(chunks, chunk_metadata)
-            
-            return {"message": f"Document processed successfully with {len(chunks)} chunks"}
-        finally:
-            # Clean up the temporary file
-            os.unlink(temp_file_path)
-            
+        meta_dict = json.loads(fields.get("metadata", "{}"))
+
+        if DEPLOY_MODE == "serve":
+            job_id = enqueue_document(SNAPSHOT_DIR, temp_file_path, filename, meta_dict, content_hash=content_hash)
+            return {"message": "Document queued for ingestion", "job_id": job_id}
+
+        if content_hash in ingested_documents:
+            return {"message": f"Document already processed with {ingested_documents[content_hash]} chunks", "duplicate": True}
+
+        # Process the document and add it to the vector store
+        n_chunks = ingest_document(
+            document_processor, rule_engine, vector_store, temp_file_path, filename, meta_dict,
+            content_hash=content_hash
+        )
+        ingested_documents[content_hash] = n_chunks
+
+        return {"message": f"Document processed successfully with {n_chunks} chunks"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing document: {str(e)}")
+    finally:
+        # Clean up the temporary file (queued uploads have already been moved)
+        if os.path.exists(temp_file_path):
+            os.unlink(temp_file_path)
+
+def build_search_query(structured_query: Dict[str, Any]) -> str:
+    """Build a search query from the structured data"""
+    search_terms = []
+    for k, v in structured_query.items():
+        if v and k != "policy_duration":
+            if isinstance(v, (str, int, float)):
+                search_terms.append(f"{k}: {v}")
+            
+    search_query = " ".join(search_terms)
+    
+    if "policy_duration" in structured_query and isinstance(structured_query["policy_duration"], dict):
+        pd = structured_query["policy_duration"]
+        if "value" in pd and "unit" in pd:
+            search_query += f" policy duration: {pd['value']} {pd['unit']}"
+
+    return search_query
 
 @app.post("/process_query", response_model=ProcessResponse)
 async def process_query(query_request: QueryRequest):
@@ -86,25 +165,14 @@ async def process_query(query_request: QueryRequest):
         # Parse the query
         structured_query = query_parser.parse_query(query)
         
-        # Build a search query from the structured data
-        search_terms = []
-        for k, v in structured_query.items():
-            if v and k != "policy_duration":
-                if isinstance(v, (str, int, float)):
-                    search_terms.append(f"{k}: {v}")
-                
-        search_query = " ".join(search_terms)
-        
-        if "policy_duration" in structured_query and isinstance(structured_query["policy_duration"], dict):
-            pd = structured_query["policy_duration"]
-            if "value" in pd and "unit" in pd:
-                search_query += f" policy duration: {pd['value']} {pd['unit']}"
-        
         # Search for relevant clauses
-        relevant_clauses = vector_store.search(search_query, k=5)
+        relevant_clauses = vector_store.search(build_search_query(structured_query), k=5)
         
-        # Make a decision
-        decision = decision_engine.make_decision(structured_query, relevant_clauses)
+        # Decide from the extracted policy rules, escalating to the model when they don't cover the case
+        decision = rule_engine.evaluate(structured_query, relevant_clauses)
+        if decision is None:
+            decision = decision_engine.make_decision(structured_query, relevant_clauses, explain=query_request.explain)
+            decision["decision_source"] = "model"
         
         # Add structured query and relevant clauses to response
         decision["structured_query"] = structured_query
@@ -118,10 +186,56 @@ async def process_query(query_request: QueryRequest):
         print(traceback.format_exc())
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+@app.post("/process_query_stream")
+async def process_query_stream(query_request: QueryRequest):
+    """Process a query, streaming each stage as a line of NDJSON as soon as it is ready
+
+    Events, in order: structured_query, relevant_clauses, then either a rules
+    decision or the model's label (structured mode), token events as text is
+    generated and the final decision.
+    """
+    def event(name: str, data: Any) -> str:
+        return json.dumps({"event": name, "data": data}) + "\n"
+
+    # A plain generator: Starlette iterates it in a threadpool, so model calls don't block the event loop
+    def events():
+        try:
+            query = query_request.query
+            print(f"Processing streamed query: {query}")  # Debug log
+
+            structured_query = query_parser.parse_query(query)
+            yield event("structured_query", structured_query)
+
+            relevant_clauses = vector_store.search(build_search_query(structured_query), k=5)
+            yield event("relevant_clauses", relevant_clauses)
+
+            decision = rule_engine.evaluate(structured_query, relevant_clauses)
+            if decision is not None:
+                yield event("decision", decision)
+                return
+
+            for item in decision_engine.stream_decision(structured_query, relevant_clauses, explain=query_request.explain):
+                if "token" in item:
+                    yield event("token", item["token"])
+                elif "label" in item:
+                    yield event("label", item["label"])
+                else:
+                    item["decision"]["decision_source"] = "model"
+                    yield event("decision", item["decision"])
+
+        except Exception as e:
+            import traceback
+            print(f"Error processing streamed query: {str(e)}")
+            print(traceback.format_exc())
+            yield event("error", f"Error processing query: {str(e)}")
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
 @app.get("/status")
 async def get_status():
     """Get the status of the system"""
     return {
         "status": "running",
-        "documents_processed": 0 if vector_store.index is None else vector_store.index.ntotal,
+        "documents_processed": len(vector_store),
+        "memory": vector_store.memory_report(),
     }
\ No newline at end of file
@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+import importlib.util
+
+def load_final_app():
+    """Import final/app.py under its own name (it would clash with the top-level app.py)"""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "final", "app.py")
+    spec = importlib.util.spec_from_file_location("final_app", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def timed(fn, repeat: int):
+    """Run fn repeat times and return (last result, list of seconds)"""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    return result, times
+
+def report(name: str, ingest_seconds: float, query_times):
+    print(f"{name}:")
+    print(f"  ingest: {ingest_seconds * 1000:.1f} ms")
+    print(f"  query:  mean {statistics.mean(query_times) * 1000:.1f} ms, "
+          f"median {statistics.median(query_times) * 1000:.1f} ms over {len(query_times)} runs")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the main pipeline and the final/ pipeline side by side")
+    parser.add_argument("document", help="Policy document to ingest (pdf, docx, txt, eml)")
+    parser.add_argument("--query", default="46-year-old male, knee surgery in Pune, 3-month-old insurance policy")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--final-backend", default="local", help="FINAL_BACKEND for final/app.py")
+    args = parser.parse_args()
+
+    # Main pipeline, configured by the same environment variables as the server
+    import app as main_app
+    from ingest_worker import ingest_document
+
+    start = time.perf_counter()
+    ingest_document(
+        main_app.document_processor, main_app.rule_engine, main_app.vector_store,
+        args.document, os.path.basename(args.document), {}
+    )
+    ingest_seconds = time.perf_counter() - start
+    request = main_app.QueryRequest(query=args.query)
+    result, query_times = timed(lambda: asyncio.run(main_app.process_query(request)), args.repeat)
+    report("main pipeline", ingest_seconds, query_times)
+    print(f"  decision: {result['decision']} ({result.get('decision_source')})")
+
+    # final/ LangChain pipeline
+    os.environ["FINAL_BACKEND"] = args.final_backend
+    final_app = load_final_app()
+
+    start = time.perf_counter()
+    final_app.process_document(args.document)
+    ingest_seconds = time.perf_counter() - start
+    answer, query_times = timed(lambda: final_app.process_query(args.query), args.repeat)
+    report(f"final pipeline ({args.final_backend})", ingest_seconds, query_times)
+    print(f"  answer: {answer}")
+
+if __name__ == "__main__":
+    sys.exit(main())
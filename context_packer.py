@@ -0,0 +1,70 @@
+import re
+from typing import Dict, Any, List, Tuple
+import numpy as np
+
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+|\n+')
+WHITESPACE_RE = re.compile(r'\s+')
+
+class ContextPacker:
+    def __init__(self, encoder, tokenizer, token_budget: int = 320, min_sentence_chars: int = 15):
+        """Pack the most query-relevant sentences of retrieved clauses into a token budget
+
+        encoder is anything with a SentenceTransformer-style encode() (e.g. VectorStore.model),
+        tokenizer is the generator's tokenizer so the budget is counted in the model's own tokens.
+        """
+        self.encoder = encoder
+        self.tokenizer = tokenizer
+        self.token_budget = token_budget
+        self.min_sentence_chars = min_sentence_chars
+
+    def pack(self, query: str, relevant_clauses: List[Dict[str, Any]]) -> Tuple[str, List[int]]:
+        """Return the packed clause text and the indices of the clauses it draws from"""
+        candidates = self._candidate_sentences(relevant_clauses)
+        if not candidates:
+            return "", []
+
+        # Score every sentence against the query in a single encode call
+        embeddings = np.asarray(self.encoder.encode([query] + [c[2] for c in candidates]), dtype=np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True) + 1e-12
+        scores = embeddings[1:] @ embeddings[0]
+
+        # Greedily take the best sentences that still fit in the budget
+        selected = []
+        used = 0
+        for i in np.argsort(-scores):
+            sentence = candidates[i][2]
+            n_tokens = len(self.tokenizer.encode(sentence, add_special_tokens=False))
+            if used + n_tokens > self.token_budget:
+                continue
+            selected.append(candidates[i])
+            used += n_tokens
+
+        # Restore document order so each clause reads coherently
+        selected.sort(key=lambda c: (c[0], c[1]))
+        grouped = {}
+        for clause_idx, _, sentence in selected:
+            grouped.setdefault(clause_idx, []).append(sentence)
+
+        text = "\n".join([f"Clause {i+1}: {' '.join(sentences)}" for i, sentences in grouped.items()])
+        return text, list(grouped.keys())
+
+    def _candidate_sentences(self, relevant_clauses: List[Dict[str, Any]]) -> List[Tuple[int, int, str]]:
+        """Split clauses into sentences, dropping repeats from overlapping chunk regions"""
+        sentences = []
+        for clause_idx, clause in enumerate(relevant_clauses):
+            for pos, sentence in enumerate(SENTENCE_SPLIT_RE.split(clause["content"])):
+                sentence = WHITESPACE_RE.sub(" ", sentence).strip()
+                if len(sentence) >= self.min_sentence_chars:
+                    sentences.append((clause_idx, pos, sentence))
+
+        # Longest first, so fragments cut at a chunk boundary are absorbed by the full sentence
+        candidates = []
+        seen = []
+        for candidate in sorted(sentences, key=lambda c: -len(c[2])):
+            normalized = candidate[2].lower()
+            if any(normalized in s for s in seen):
+                continue
+            seen.append(normalized)
+            candidates.append(candidate)
+
+        return candidates
@@ -1,73 +1,233 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Iterator
 import re
 import json
-from transformers import pipeline
+import threading
+import torch
+from transformers import pipeline, TextIteratorStreamer
+
+from context_packer import ContextPacker
+
+# Fixed label set scored by the structured decision mode
+DECISION_LABELS = ("approved", "rejected", "undetermined")
 
 class DecisionEngine:
-    def __init__(self):
-        """Initialize the decision engine with local model"""
+    def __init__(self, mode: str = "generate", justification_max_new_tokens: int = 48,
+                 justification_max_time: float = 2.0, context_encoder=None, context_token_budget: int = 320,
+                 stream_timeout: float = 60.0):
+        """Initialize the decision engine with local model
+
+        mode="generate" asks the model for free text and scans it for a decision.
+        mode="structured" scores DECISION_LABELS in a single forward pass and only
+        generates a (short, time-capped) justification when asked for one.
+        If context_encoder is given, clauses are packed sentence by sentence into
+        context_token_budget tokens instead of taking the first 200 characters of three.
+        stream_timeout bounds the wait for each streamed piece of text.
+        """
+        if mode not in ("generate", "structured"):
+            raise ValueError(f"Unsupported decision mode: {mode}")
+        self.mode = mode
+        self.justification_max_new_tokens = justification_max_new_tokens
+        self.justification_max_time = justification_max_time
+        self.stream_timeout = stream_timeout
+
         # Use a small model that can run on CPU
         self.pipe = pipeline(
             "text2text-generation",
             model="google/flan-t5-small",  # Small model (~80MB) that can run on CPU
             device_map="auto"
         )
-    
-    def make_decision(self, structured_query: Dict[str, Any], relevant_clauses: List[Dict[str, Any]]) -> Dict[str, Any]:
+
+        self.context_packer = None
+        if context_encoder is not None:
+            self.context_packer = ContextPacker(context_encoder, self.pipe.tokenizer, token_budget=context_token_budget)
+
+    def make_decision(self, structured_query: Dict[str, Any], relevant_clauses: List[Dict[str, Any]],
+                      explain: Optional[bool] = None) -> Dict[str, Any]:
         """Make a decision based on structured query and relevant clauses"""
-        # Format the query and clauses for the prompt
-        query_str = ", ".join([f"{k}: {v}" for k, v in structured_query.items() if isinstance(v, (str, int, float))])
-        
-        # Join relevant clauses
-        clauses_text = "\n".join([f"Clause {i+1}: {c['content'][:200]}" for i, c in enumerate(relevant_clauses[:3])])
-        
-        prompt = f"""
-        Given these insurance claim details:
-        {query_str}
-        
-        And these policy clauses:
-        {clauses_text}
-        
-        Determine if the claim is approved or rejected and explain why.
+        for event in self._decide(structured_query, relevant_clauses, explain, stream=False):
+            if "decision" in event:
+                return event["decision"]
+
+    def stream_decision(self, structured_query: Dict[str, Any], relevant_clauses: List[Dict[str, Any]],
+                        explain: Optional[bool] = None) -> Iterator[Dict[str, Any]]:
+        """Yield {"token": text} events as the model generates, then {"decision": result}
+
+        In structured mode a {"label": ...} event precedes the justification tokens.
         """
-        
+        return self._decide(structured_query, relevant_clauses, explain, stream=True)
+
+    def _decide(self, structured_query: Dict[str, Any], relevant_clauses: List[Dict[str, Any]],
+                explain: Optional[bool], stream: bool) -> Iterator[Dict[str, Any]]:
         try:
-            # Generate a decision
-            response = self.pipe(prompt, max_length=200, temperature=0.1)[0]['generated_text']
-            
-            # Try to parse the decision from the text
-            if "approved" in response.lower():
-                decision = "approved"
-            elif "rejected" in response.lower():
-                decision = "rejected"
+            prompt, clause_indices = self._build_prompt(structured_query, relevant_clauses)
+
+            if self.mode == "structured":
+                # Score the fixed label set and optionally generate a short justification
+                scores = self._score_labels(
+                    prompt + "Is the claim approved, rejected or undetermined? Answer with one word.\n"
+                )
+                decision = max(scores, key=scores.get)
+                confidence = scores[decision]
+
+                if not explain:
+                    # No justification is generated, so there are no clause citations to report
+                    yield {"decision": {
+                        "decision": decision,
+                        "amount": None,
+                        "justification": f"Claim {decision} (confidence {confidence:.2f}).",
+                        "clause_references": [],
+                        "confidence": confidence
+                    }}
+                    return
+
+                if stream:
+                    yield {"label": {"decision": decision, "confidence": confidence}}
+
+                response = ""
+                for text in self._generate(
+                    prompt + f"The claim is {decision}. Explain why in one sentence.\n",
+                    stream,
+                    max_new_tokens=self.justification_max_new_tokens,
+                    max_time=self.justification_max_time,
+                    do_sample=False
+                ):
+                    response += text
+                    if stream:
+                        yield {"token": text}
             else:
-                decision = "undetermined"
-                
-            # Extract any numbers that might be amounts
-            amount_match = re.search(r'(\d+,?\d*)', response)
-            amount = float(amount_match.group(0).replace(',', '')) if amount_match else None
-            
+                # Generate a decision
+                response = ""
+                for text in self._generate(
+                    prompt + "Determine if the claim is approved or rejected and explain why.\n",
+                    stream,
+                    max_length=200,
+                    temperature=0.1
+                ):
+                    response += text
+                    if stream:
+                        yield {"token": text}
+
+                # Try to parse the decision from the text
+                if "approved" in response.lower():
+                    decision = "approved"
+                elif "rejected" in response.lower():
+                    decision = "rejected"
+                else:
+                    decision = "undetermined"
+                confidence = None
+
             # Use the response as justification
-            justification = response.strip()
-            
-            # Extract clause references
-            clause_refs = []
-            for i, clause in enumerate(relevant_clauses[:3]):
-                if f"Clause {i+1}" in response or f"clause {i+1}" in response.lower():
-                    clause_refs.append(f"Clause {i+1}")
-            
-            return {
+            result = {
                 "decision": decision,
-                "amount": amount,
-                "justification": justification,
-                "clause_references": clause_refs
+                "amount": self._extract_amount(response),
+                "justification": response.strip(),
+                "clause_references": self._extract_clause_refs(response, clause_indices)
             }
-            
+            if confidence is not None:
+                result["confidence"] = confidence
+            yield {"decision": result}
+
         except Exception as e:
             print(f"Error in decision engine: {e}")
-            return {
-                "decision": "undetermined",
-                "amount": None,
-                "justification": "Unable to determine decision due to processing error.",
-                "clause_references": []
-            }
\ No newline at end of file
+            yield {"decision": self._error_decision()}
+
+    def _generate(self, prompt: str, stream: bool, **generate_kwargs) -> Iterator[str]:
+        """Generate text in one piece, or piece by piece as the model produces it"""
+        if not stream:
+            yield self.pipe(prompt, **generate_kwargs)[0]['generated_text']
+            return
+
+        model = self.pipe.model
+        tokenizer = self.pipe.tokenizer
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True).to(model.device)
+        streamer = TextIteratorStreamer(tokenizer, skip_special_tokens=True, timeout=self.stream_timeout)
+
+        # generate() runs in a thread and pushes decoded text into the streamer
+        errors = []
+
+        def run_generate():
+            try:
+                model.generate(**inputs, streamer=streamer, **generate_kwargs)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                # Always end the stream, or a failed generate() leaves the reader waiting for the timeout
+                streamer.end()
+
+        thread = threading.Thread(target=run_generate)
+        thread.start()
+        for text in streamer:
+            if text:
+                yield text
+        thread.join()
+        if errors:
+            raise errors[0]
+
+    def _build_prompt(self, structured_query: Dict[str, Any], relevant_clauses: List[Dict[str, Any]]):
+        """Format the query and clauses for the prompt, returning it with the clause indices it uses"""
+        query_str = ", ".join([f"{k}: {v}" for k, v in structured_query.items() if isinstance(v, (str, int, float))])
+
+        if self.context_packer is not None:
+            clauses_text, clause_indices = self.context_packer.pack(query_str, relevant_clauses)
+        else:
+            # Join relevant clauses
+            clauses_text = "\n".join([f"Clause {i+1}: {c['content'][:200]}" for i, c in enumerate(relevant_clauses[:3])])
+            clause_indices = list(range(len(relevant_clauses[:3])))
+
+        prompt = f"""
+        Given these insurance claim details:
+        {query_str}
+
+        And these policy clauses:
+        {clauses_text}
+
+        """
+        return prompt, clause_indices
+
+    def _score_labels(self, prompt: str) -> Dict[str, float]:
+        """Score every decision label against the prompt in one forward pass.
+
+        The encoder runs once; the labels are batched as decoder targets and each
+        is scored by its mean token log-likelihood, then normalised across labels.
+        """
+        model = self.pipe.model
+        tokenizer = self.pipe.tokenizer
+
+        inputs = tokenizer(prompt, return_tensors="pt", truncation=True).to(model.device)
+        labels = tokenizer(list(DECISION_LABELS), return_tensors="pt", padding=True).input_ids.to(model.device)
+        labels[labels == tokenizer.pad_token_id] = -100
+        n_labels = labels.shape[0]
+
+        with torch.no_grad():
+            encoder_hidden = model.get_encoder()(**inputs).last_hidden_state
+            outputs = model(
+                encoder_outputs=(encoder_hidden.expand(n_labels, -1, -1),),
+                attention_mask=inputs["attention_mask"].expand(n_labels, -1),
+                labels=labels
+            )
+
+        mask = labels != -100
+        log_probs = outputs.logits.log_softmax(dim=-1)
+        token_log_probs = log_probs.gather(-1, labels.clamp(min=0).unsqueeze(-1)).squeeze(-1)
+        label_scores = (token_log_probs * mask).sum(dim=-1) / mask.sum(dim=-1)
+        probs = label_scores.softmax(dim=-1).tolist()
+
+        return dict(zip(DECISION_LABELS, probs))
+
+    def _extract_amount(self, response: str) -> Optional[float]:
+        """Extract any numbers that might be amounts"""
+        amount_match = re.search(r'(\d+,?\d*)', response)
+        return float(amount_match.group(0).replace(',', '')) if amount_match else None
+
+    def _extract_clause_refs(self, response: str, clause_indices: List[int]) -> List[str]:
+        """Extract references to the clauses that were actually in the prompt"""
+        cited = {int(n) for n in re.findall(r'\bclause\s+(\d+)\b', response.lower())}
+        return [f"Clause {i+1}" for i in clause_indices if i + 1 in cited]
+
+    def _error_decision(self) -> Dict[str, Any]:
+        return {
+            "decision": "undetermined",
+            "amount": None,
+            "justification": "Unable to determine decision due to processing error.",
+            "clause_references": []
+        }
@@ -0,0 +1,155 @@
+import os
+from typing import List, Union, Optional
+import numpy as np
+
+# torch and sentence_transformers are imported inside the encoders that use them, so
+# processes that only handle precomputed vectors (shard workers) never load them
+
+ENCODER_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+
+class TorchEncoder:
+    """Plain fp32 SentenceTransformer (the reference backend)"""
+
+    def __init__(self, model_name: str, device: Optional[str] = None):
+        from sentence_transformers import SentenceTransformer
+
+        # device=None lets SentenceTransformer pick CUDA when it is available
+        self.model = SentenceTransformer(model_name, device=device)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        # SentenceTransformer.encode already sorts each call by length before batching
+        return self.model.encode(sentences, batch_size=batch_size, convert_to_numpy=True, **kwargs)
+
+class QuantizedTorchEncoder(TorchEncoder):
+    """SentenceTransformer with its Linear layers dynamically quantized to int8"""
+
+    def __init__(self, model_name: str):
+        # Dynamic quantization only has CPU kernels
+        super().__init__(model_name, device="cpu")
+        import torch
+
+        self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+class OnnxEncoder:
+    """Transformer exported to ONNX and run with ONNX Runtime, pooled in numpy"""
+
+    def __init__(self, model_name: str, quantize: bool = False, cache_dir: str = None):
+        try:
+            import onnxruntime as ort
+        except ImportError:
+            raise ImportError("The onnx encoder backends require onnxruntime, and onnx-int8 also onnx (pip install -r requirements-optional.txt)")
+
+        from sentence_transformers import SentenceTransformer
+
+        st_model = SentenceTransformer(model_name, device="cpu")
+        self.tokenizer = st_model.tokenizer
+        self.max_seq_length = st_model.max_seq_length
+        self.dimension = st_model.get_sentence_embedding_dimension()
+        self.pooling = "cls" if st_model[1].pooling_mode_cls_token else "mean"
+
+        cache_dir = cache_dir or os.path.join(os.path.expanduser("~"), ".cache", "onnx_encoders")
+        os.makedirs(cache_dir, exist_ok=True)
+        model_path = os.path.join(cache_dir, model_name.replace("/", "_") + ".onnx")
+        if not os.path.exists(model_path):
+            self._export(st_model[0].auto_model, model_path)
+
+        if quantize:
+            quantized_path = model_path.replace(".onnx", ".int8.onnx")
+            if not os.path.exists(quantized_path):
+                try:
+                    from onnxruntime.quantization import quantize_dynamic, QuantType
+                except ImportError:
+                    raise ImportError(
+                        "The onnx-int8 encoder backend requires onnxruntime and onnx "
+                        "(pip install -r requirements-optional.txt)"
+                    )
+                quantize_dynamic(model_path, quantized_path, weight_type=QuantType.QInt8)
+            model_path = quantized_path
+
+        # The torch weights are no longer needed once the graph is on disk
+        del st_model
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _export(self, auto_model, model_path: str):
+        """Export the underlying Hugging Face model with dynamic batch and sequence axes"""
+        import torch
+
+        dummy = self.tokenizer(["export"], return_tensors="pt")
+        input_names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in dummy]
+        dynamic_axes = {n: {0: "batch", 1: "sequence"} for n in input_names + ["last_hidden_state"]}
+
+        auto_model.eval()
+        with torch.no_grad():
+            torch.onnx.export(
+                auto_model,
+                tuple(dummy[n] for n in input_names),
+                model_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=14
+            )
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+
+        # Batch texts of similar length together so little of each batch is padding
+        order = np.argsort([-len(s) for s in sentences])
+        embeddings = np.empty((len(sentences), self.dimension), dtype=np.float32)
+
+        for start in range(0, len(sentences), batch_size):
+            batch_idx = order[start:start + batch_size]
+            batch = self.tokenizer(
+                [sentences[i] for i in batch_idx],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            feeds = {k: v.astype(np.int64) for k, v in batch.items() if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+
+            if self.pooling == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = batch["attention_mask"][..., None].astype(np.float32)
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            embeddings[batch_idx] = pooled
+
+        return embeddings
+
+class PrecomputedEncoder:
+    """Stand-in for stores that only receive precomputed vectors, such as shard workers"""
+
+    def __init__(self, dimension: int):
+        self.dimension = dimension
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32, **kwargs) -> np.ndarray:
+        raise RuntimeError("This store only accepts precomputed vectors")
+
+def create_encoder(model_name: str, backend: str = "torch"):
+    """Build an embedding encoder for one of ENCODER_BACKENDS"""
+    if backend == "torch":
+        return TorchEncoder(model_name)
+    elif backend == "torch-int8":
+        return QuantizedTorchEncoder(model_name)
+    elif backend == "onnx":
+        return OnnxEncoder(model_name)
+    elif backend == "onnx-int8":
+        return OnnxEncoder(model_name, quantize=True)
+    else:
+        raise ValueError(f"Unsupported encoder backend: {backend}")
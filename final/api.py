@@ -1,10 +1,36 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Request, request, jsonify
+from werkzeug.exceptions import HTTPException
 from app import process_document, process_query
 import json
 import os
-import tempfile
+import sys
+
+# Shared upload helpers live one level up; appended so final/app.py still wins for "app"
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploads import UploadWriter, UploadTooLarge
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+
+class UploadRequest(Request):
+    """Request whose file parts Werkzeug writes straight into hashed, size-limited temp files"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        writer = UploadWriter(os.path.splitext(filename or "")[1], None, MAX_UPLOAD_BYTES)
+        self.upload_writers.append(writer)
+        return writer
+
+    @property
+    def upload_writers(self):
+        # Every temp file created for this request, so the view can remove them all
+        return self.__dict__.setdefault("_upload_writers", [])
 
 app = Flask(__name__, static_folder='static')
+app.request_class = UploadRequest
+# Reject bodies whose Content-Length is over the limit before parsing them
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES
+
+# Content hash -> chunk count of every document processed by this process
+processed_documents = {}
 
 @app.route('/')
 def index():
@@ -12,29 +38,35 @@ def index():
 
 @app.route('/upload', methods=['POST'])
 def upload():
-    if 'document' not in request.files:
-        return jsonify({"error": "No document provided"}), 400
-    
-    file = request.files['document']
-    metadata_str = request.form.get('metadata', '{}')
-    
-    try:
-        metadata = json.loads(metadata_str)
-    except json.JSONDecodeError:
-        return jsonify({"error": "Invalid metadata JSON"}), 400
-    
-    # Save file temporarily
-    temp_file = tempfile.NamedTemporaryFile(delete=False)
-    file.save(temp_file.name)
-    temp_file.close()
-    
     try:
-        chunks_processed = process_document(temp_file.name, metadata)
-        os.unlink(temp_file.name)  # Delete temp file
+        # Parsing the form writes the file to disk, hashing and size-checking each chunk
+        if 'document' not in request.files:
+            return jsonify({"error": "No document provided"}), 400
+
+        file = request.files['document']
+        metadata_str = request.form.get('metadata', '{}')
+
+        try:
+            metadata = json.loads(metadata_str)
+        except json.JSONDecodeError:
+            return jsonify({"error": "Invalid metadata JSON"}), 400
+
+        temp_path, content_hash, _ = file.stream.finish()
+        if content_hash in processed_documents:
+            return jsonify({"success": True, "chunks_processed": processed_documents[content_hash], "duplicate": True})
+        chunks_processed = process_document(temp_path, metadata)
+        processed_documents[content_hash] = chunks_processed
         return jsonify({"success": True, "chunks_processed": chunks_processed})
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    except HTTPException:
+        raise
     except Exception as e:
-        os.unlink(temp_file.name)  # Delete temp file
         return jsonify({"error": str(e)}), 500
+    finally:
+        # Delete the temp files
+        for writer in request.upload_writers:
+            writer.discard()
 
 @app.route('/query', methods=['POST'])
 def query():
@@ -1,48 +1,121 @@
 import os
-from langchain.vectorstores import Pinecone
-from langchain.embeddings import HuggingFaceBgeEmbeddings
+import sys
+from typing import List, Dict, Any
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.document_loaders import PyPDFLoader, Docx2txtLoader, TextLoader, UnstructuredEmailLoader
-from langchain.chains import RetrievalQA
-from langchain_groq import ChatGroq
-import pinecone
 from dotenv import load_dotenv
 
+# The shared retriever interface and local vector store live one level up;
+# appended so this directory's modules still take precedence
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from retrieval import Retriever, Generator
+
 load_dotenv()
 
-# Initialize embeddings model with BGEM3
-model_name = "BAAI/bge-large-en-v1.5"  # BGEM3 model
-model_kwargs = {'device': 'cuda'}  # Use GPU if available
-encode_kwargs = {'normalize_embeddings': True}
-
-embedding = HuggingFaceBgeEmbeddings(
-    model_name=model_name,
-    model_kwargs=model_kwargs,
-    encode_kwargs=encode_kwargs
-)
-
-# Initialize Pinecone
-pinecone.init(
-    api_key=oos.getenv("PINECONE_API_KEY"),
-    region="us-east-1"  # Change to your region
-)
-
-index_name = "document-retrieval"
-# Create index if it doesn't exist
-if index_name not in pinecone.list_indexes():
-    pinecone.create_index(
-        name=index_name,
-        dimension=1024,  # BGEM3 embedding dimension
-        metric="cosine"
-    )
+# "pinecone": Pinecone + BGE embeddings + Groq-hosted LLM (needs API keys).
+# "local": FAISS VectorStore + flan-t5 on CPU, for offline runs and benchmarks.
+BACKEND = os.getenv("FINAL_BACKEND", "pinecone")
+
+QA_PROMPT = """Use the following pieces of context to answer the question at the end. If you don't know the answer, just say that you don't know, don't try to make up an answer.
+
+{context}
+
+Question: {question}
+Helpful Answer:"""
+
+class PineconeRetriever(Retriever):
+    def __init__(self):
+        """Connect to the Pinecone index with BGE embeddings"""
+        from langchain.vectorstores import Pinecone
+        from langchain.embeddings import HuggingFaceBgeEmbeddings
+        import pinecone
+        import torch
+
+        # Initialize embeddings model with BGEM3
+        model_name = "BAAI/bge-large-en-v1.5"  # BGEM3 model
+        model_kwargs = {'device': os.getenv("EMBEDDING_DEVICE", "cuda" if torch.cuda.is_available() else "cpu")}
+        encode_kwargs = {'normalize_embeddings': True}
+
+        embedding = HuggingFaceBgeEmbeddings(
+            model_name=model_name,
+            model_kwargs=model_kwargs,
+            encode_kwargs=encode_kwargs
+        )
+
+        # Initialize Pinecone
+        pinecone.init(
+            api_key=os.getenv("PINECONE_API_KEY"),
+            region="us-east-1"  # Change to your region
+        )
+
+        index_name = "document-retrieval"
+        # Create index if it doesn't exist
+        if index_name not in pinecone.list_indexes():
+            pinecone.create_index(
+                name=index_name,
+                dimension=1024,  # BGEM3 embedding dimension
+                metric="cosine"
+            )
+
+        # Connect to the index
+        index = pinecone.Index(index_name)
+
+        # Create vector store
+        self.vectorstore = Pinecone(
+            index, embedding.embed_query, "text"
+        )
+
+    def add_documents(self, chunks: List[str], metadata: List[Dict[str, Any]] = None):
+        self.vectorstore.add_texts(chunks, metadatas=metadata)
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        return [
+            {"content": doc.page_content, "score": float(score), "metadata": doc.metadata}
+            for doc, score in self.vectorstore.similarity_search_with_score(query, k=k)
+        ]
 
-# Connect to the index
-index = pinecone.Index(index_name)
+class GroqGenerator(Generator):
+    def __init__(self):
+        """Initialize LLM with ChatGroq using llama-3.3-70b-versatile model"""
+        from langchain_groq import ChatGroq
 
-# Create vector store
-vectorstore = Pinecone(
-    index, embedding.embed_query, "text"
-)
+        self.llm = ChatGroq(
+            model_name="llama-3.3-70b-versatile",
+            temperature=0,
+            groq_api_key=os.getenv("GROQ_API_KEY")
+        )
+
+    def generate(self, question: str, passages: List[Dict[str, Any]]) -> str:
+        context = "\n\n".join(p["content"] for p in passages)
+        return self.llm.predict(QA_PROMPT.format(context=context, question=question))
+
+class LocalGenerator(Generator):
+    def __init__(self, model_name: str = "google/flan-t5-small", max_new_tokens: int = 128):
+        """Stand-in for the hosted LLM: a small seq2seq model on CPU"""
+        from transformers import pipeline
+
+        self.max_new_tokens = max_new_tokens
+        self.pipe = pipeline("text2text-generation", model=model_name, device=-1)
+
+    def generate(self, question: str, passages: List[Dict[str, Any]]) -> str:
+        context = "\n\n".join(p["content"] for p in passages)
+        prompt = QA_PROMPT.format(context=context, question=question)
+        return self.pipe(prompt, max_new_tokens=self.max_new_tokens, truncation=True)[0]['generated_text']
+
+def create_backend(backend: str = BACKEND):
+    """Build the retriever and generator for a backend name"""
+    if backend == "pinecone":
+        return PineconeRetriever(), GroqGenerator()
+    elif backend == "local":
+        from vector_store import VectorStore
+        return (
+            VectorStore(os.getenv("LOCAL_EMBEDDING_MODEL", "all-MiniLM-L6-v2")),
+            LocalGenerator(os.getenv("LOCAL_GENERATOR_MODEL", "google/flan-t5-small"))
+        )
+    else:
+        raise ValueError(f"Unsupported backend: {backend}")
+
+retriever, generator = create_backend()
 
 # Document processing function
 def process_document(file_path, metadata=None):
@@ -57,47 +130,29 @@ def process_document(file_path, metadata=None):
         loader = UnstructuredEmailLoader(file_path)
     else:
         raise ValueError("Unsupported file type")
-    
+
     # Load documents
     documents = loader.load()
-    
+
     # Add metadata if provided
     if metadata:
         for doc in documents:
             doc.metadata.update(metadata)
-    
+
     # Split documents into chunks
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=1000,
         chunk_overlap=200
     )
     chunks = text_splitter.split_documents(documents)
-    
-    # Add to vectorstore
-    vectorstore.add_documents(chunks)
-    
+
+    # Add to the configured vector store
+    retriever.add_documents([c.page_content for c in chunks], [c.metadata for c in chunks])
+
     return len(chunks)
 
 # Query processing function
 def process_query(query_text):
-    # Create retrieval chain
-    retriever = vectorstore.as_retriever(search_kwargs={"k": 5})
-    
-    # Initialize LLM with ChatGroq using llama-3.3-70b-versatile model
-    llm = ChatGroq(
-        model_name="llama-3.3-70b-versatile",
-        temperature=0,
-        groq_api_key=os.getenv("GROQ_API_KEY")
-    )
-    
-    # Create QA chain
-    qa_chain = RetrievalQA.from_chain_type(
-        llm=llm,
-        chain_type="stuff",
-        retriever=retriever
-    )
-    
-    # Process query
-    result = qa_chain.run(query_text)
-    
-    return result
\ No newline at end of file
+    # Retrieve the top chunks and "stuff" them into one prompt
+    passages = retriever.search(query_text, k=5)
+    return generator.generate(query_text, passages)
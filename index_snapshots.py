@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import threading
+from typing import List, Dict, Any, Optional
+import numpy as np
+import faiss
+
+from encoders import create_encoder
+from vector_store import VectorStore
+from retrieval import Retriever
+
+CURRENT_FILE = "CURRENT"
+INBOX_DIR = "inbox"
+
+class MappedStrings:
+    """Read-only list of strings backed by a memory-mapped file, shared by every process that maps it"""
+
+    def __init__(self, directory: str, name: str):
+        self.offsets = np.load(os.path.join(directory, f"{name}.idx.npy"), mmap_mode="r")
+        data_path = os.path.join(directory, f"{name}.bin")
+        self.data = np.memmap(data_path, dtype=np.uint8, mode="r") if os.path.getsize(data_path) else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return bytes(self.data[self.offsets[i]:self.offsets[i + 1]]).decode("utf-8")
+
+class MappedJson(MappedStrings):
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return json.loads(super().__getitem__(i))
+
+class MappedFlatIndex:
+    """Exact L2 search over memory-mapped float32 vectors, with the FAISS search() signature.
+
+    Used for flat snapshots so serving workers share the vectors through the page
+    cache instead of each reading a private copy into an IndexFlatL2.
+    """
+
+    def __init__(self, vectors: np.ndarray):
+        self.vectors = vectors
+        self.ntotal = len(vectors)
+        self.is_trained = True
+
+    def search(self, query_vectors: np.ndarray, k: int):
+        k = min(k, self.ntotal)
+        distances = 2 - 2 * (query_vectors @ self.vectors.T)
+        indices = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distances, indices, axis=1).argsort(axis=1)
+        indices = np.take_along_axis(indices, order, axis=1)
+        return np.take_along_axis(distances, indices, axis=1), indices
+
+def _write_strings(directory: str, name: str, strings: List[str]):
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    with open(os.path.join(directory, f"{name}.bin"), "wb") as f:
+        for b in encoded:
+            f.write(b)
+    np.save(os.path.join(directory, f"{name}.idx.npy"), offsets)
+
+def _atomic_write(path: str, content: str):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+def current_version(root: str) -> int:
+    """Version number of the published snapshot, or 0 if there is none"""
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return int(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+def publish_snapshot(store: VectorStore, root: str, keep: int = 3) -> int:
+    """Write an immutable snapshot of store under root and make it the current version"""
+    os.makedirs(root, exist_ok=True)
+    version = current_version(root) + 1
+    snapshot_dir = os.path.join(root, f"v{version:06d}")
+    tmp_dir = snapshot_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    _write_strings(tmp_dir, "texts", list(store.texts))
+    _write_strings(tmp_dir, "metadata", [json.dumps(m) for m in store.metadata])
+
+    index = store.index if store.index is not None else store._create_index()
+    vectors_path = os.path.join(tmp_dir, "vectors.f32")
+    if store.index_type == "flat":
+        # Flat snapshots are served straight from the raw vectors
+        index.reconstruct_n(0, index.ntotal).astype(np.float32).tofile(vectors_path)
+    else:
+        faiss.write_index(index, os.path.join(tmp_dir, "index.faiss"))
+        np.save(os.path.join(tmp_dir, "pending.npy"), store.pending)
+        if store.rescore_k > 0:
+            shutil.copyfile(store.vectors_path, vectors_path)
+
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump({
+            "version": version,
+            "count": len(store.texts),
+            "dimension": store.dimension,
+            "index_type": store.index_type,
+            "pq_m": store.pq_m,
+            "rescore_k": store.rescore_k,
+            "model_name": store.model_name,
+            "created": time.time()
+        }, f)
+
+    os.rename(tmp_dir, snapshot_dir)
+    _atomic_write(os.path.join(root, CURRENT_FILE), str(version))
+
+    # Old versions may still be mapped by workers that haven't swapped yet, so keep a few
+    for old in range(version - keep, 0, -1):
+        old_dir = os.path.join(root, f"v{old:06d}")
+        if not os.path.exists(old_dir):
+            break
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    return version
+
+def enqueue_document(root: str, file_path: str, filename: str, metadata: Dict[str, Any],
+                     content_hash: Optional[str] = None) -> str:
+    """Hand an uploaded file to the ingestion process; the file is moved into the inbox
+
+    With a content_hash the job id is the hash, so re-uploading a document that is
+    still queued doesn't queue it twice.
+    """
+    inbox = os.path.join(root, INBOX_DIR)
+    os.makedirs(inbox, exist_ok=True)
+    job_id = content_hash or uuid.uuid4().hex
+    job_path = os.path.join(inbox, f"{job_id}.json")
+    if os.path.exists(job_path):
+        os.unlink(file_path)
+        return job_id
+
+    document_path = os.path.join(inbox, job_id + os.path.splitext(filename)[1])
+    shutil.move(file_path, document_path)
+
+    # The job file is written last, so the ingestion process only sees complete uploads
+    _atomic_write(
+        job_path,
+        json.dumps({"path": document_path, "filename": filename, "metadata": metadata, "content_hash": content_hash})
+    )
+    return job_id
+
+class SnapshotStore(Retriever):
+    def __init__(self, root: str, model_name: str = "all-MiniLM-L6-v2", backend: str = "torch",
+                 poll_interval: float = 2.0, encoder=None):
+        """Read-only VectorStore that serves the current published snapshot
+
+        Snapshot data is memory-mapped, so all serving workers on a host share one
+        copy. The CURRENT pointer is checked at most every poll_interval seconds and
+        a newer version is swapped in without interrupting searches in flight.
+        """
+        self.root = root
+        self.poll_interval = poll_interval
+        self.model = encoder if encoder is not None else create_encoder(model_name, backend)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.store = None
+        self.version = 0
+        self._last_poll = 0.0
+        self._lock = threading.Lock()
+        self.refresh()
+
+    def refresh(self):
+        """Swap to the current snapshot if it has changed"""
+        with self._lock:
+            self._last_poll = time.monotonic()
+            version = current_version(self.root)
+            if version and version != self.version:
+                self.store = self._load(os.path.join(self.root, f"v{version:06d}"))
+                self.version = version
+                print(f"Serving index snapshot v{version:06d} ({len(self.store)} chunks)")
+
+    def _load(self, directory: str) -> VectorStore:
+        with open(os.path.join(directory, "manifest.json")) as f:
+            manifest = json.load(f)
+
+        vectors_path = os.path.join(directory, "vectors.f32")
+        has_vectors = os.path.exists(vectors_path) and manifest["count"] > 0
+        store = VectorStore(
+            encoder=self.model,
+            index_type=manifest["index_type"],
+            pq_m=manifest["pq_m"],
+            rescore_k=manifest["rescore_k"] if has_vectors else 0,
+            vectors_path=vectors_path if has_vectors else None
+        )
+        store.texts = MappedStrings(directory, "texts")
+        store.metadata = MappedJson(directory, "metadata")
+
+        if manifest["index_type"] == "flat":
+            vectors = np.empty((0, self.dimension), dtype=np.float32)
+            if has_vectors:
+                vectors = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(manifest["count"], self.dimension))
+            store.index = MappedFlatIndex(vectors)
+        else:
+            # Newer FAISS can map flat-code indexes (SQ, PQ) directly; older versions read a private copy
+            flags = getattr(faiss, "IO_FLAG_MMAP_IFC", 0) | faiss.IO_FLAG_READ_ONLY
+            store.index = faiss.read_index(os.path.join(directory, "index.faiss"), flags)
+            store.pending = np.load(os.path.join(directory, "pending.npy"), mmap_mode="r")
+
+        return store
+
+    def _poll(self):
+        """Refresh if the CURRENT pointer hasn't been checked for poll_interval seconds"""
+        if time.monotonic() - self._last_poll >= self.poll_interval:
+            self.refresh()
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Search the current snapshot"""
+        self._poll()
+        store = self.store
+        if store is None:
+            return []
+        return store.search(query, k)
+
+    def add_documents(self, chunks: List[str], metadata: List[Dict[str, Any]] = None):
+        raise RuntimeError("Snapshot stores are read-only; documents are added by the ingestion process")
+
+    def __len__(self) -> int:
+        self._poll()
+        store = self.store
+        return 0 if store is None else len(store)
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Snapshot version and mapped file sizes"""
+        self._poll()
+        with self._lock:
+            version, store = self.version, self.store
+        directory = os.path.join(self.root, f"v{version:06d}")
+        files = {}
+        if version and os.path.isdir(directory):
+            files = {name: os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)}
+        return {
+            "snapshot_version": version,
+            "vectors": 0 if store is None else len(store),
+            "mapped_files_bytes": files
+        }
@@ -0,0 +1,82 @@
+import os
+import json
+import time
+
+from document_processor import DocumentProcessor
+from vector_store import VectorStore
+from rule_engine import RuleEngine
+from index_snapshots import INBOX_DIR, publish_snapshot
+
+def ingest_document(document_processor: DocumentProcessor, rule_engine: RuleEngine, vector_store: VectorStore,
+                    file_path: str, filename: str, meta_dict: dict, content_hash: str = None) -> int:
+    """Chunk a document, attach metadata and rules, and add it to the store"""
+    chunks = document_processor.process_document(file_path)
+
+    # Create metadata for each chunk
+    chunk_metadata = []
+    for i, chunk in enumerate(chunks):
+        chunk_meta = meta_dict.copy()
+        chunk_meta["document_name"] = filename
+        chunk_meta["chunk_id"] = i
+        if content_hash is not None:
+            chunk_meta["content_hash"] = content_hash
+        chunk_meta["rules"] = rule_engine.extract_rules(chunk)
+        chunk_metadata.append(chunk_meta)
+
+    vector_store.add_documents(chunks, chunk_metadata)
+    return len(chunks)
+
+def run(root: str, poll_interval: float = 1.0):
+    """Own all index writes: ingest queued uploads and publish a snapshot after each batch"""
+    inbox = os.path.join(root, INBOX_DIR)
+    state_dir = os.path.join(root, "writer")
+    os.makedirs(inbox, exist_ok=True)
+
+    store_kwargs = {
+        "backend": os.getenv("EMBEDDING_BACKEND", "torch"),
+        "index_type": os.getenv("INDEX_TYPE", "flat"),
+        "rescore_k": int(os.getenv("RESCORE_K", "0")),
+    }
+    model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    if os.path.exists(os.path.join(state_dir, "index.faiss")):
+        vector_store = VectorStore.load(state_dir, model_name, **store_kwargs)
+    else:
+        vector_store = VectorStore(model_name, **store_kwargs)
+
+    document_processor = DocumentProcessor()
+    rule_engine = RuleEngine()
+    ingested_hashes = {m.get("content_hash") for m in vector_store.metadata}
+    print(f"Ingestion process watching {inbox}")
+
+    while True:
+        jobs = sorted(f for f in os.listdir(inbox) if f.endswith(".json"))
+        for job_file in jobs:
+            job_path = os.path.join(inbox, job_file)
+            with open(job_path) as f:
+                job = json.load(f)
+            try:
+                if job.get("content_hash") and job["content_hash"] in ingested_hashes:
+                    print(f"Skipping {job['filename']}: already ingested")
+                    continue
+                n_chunks = ingest_document(
+                    document_processor, rule_engine, vector_store,
+                    job["path"], job["filename"], job["metadata"], content_hash=job.get("content_hash")
+                )
+                ingested_hashes.add(job.get("content_hash"))
+                print(f"Ingested {job['filename']} with {n_chunks} chunks")
+            except Exception as e:
+                print(f"Error ingesting {job['filename']}: {e}")
+            finally:
+                os.unlink(job_path)
+                if os.path.exists(job["path"]):
+                    os.unlink(job["path"])
+
+        if jobs:
+            vector_store.save(state_dir)
+            version = publish_snapshot(vector_store, root)
+            print(f"Published index snapshot v{version:06d}")
+
+        time.sleep(poll_interval)
+
+if __name__ == "__main__":
+    run(os.getenv("SNAPSHOT_DIR", "./snapshots"))
@@ -243,5 +243,9 @@ if __name__ == "__main__":
     print("Using local models for query parsing and decision making")
     print("The system is starting up - this might take a minute for the first run as models are downloaded")
     
-    # Run the application
-    uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
+    # Run the application. With DEPLOY_MODE=serve, start ingest_worker.py separately;
+    # every worker then serves the same memory-mapped index snapshot.
+    if os.getenv("DEPLOY_MODE", "single") == "serve":
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=int(os.getenv("WORKERS", "2")))
+    else:
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,24 @@
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any
+
+class Retriever(ABC):
+    """Interface shared by every vector store the pipelines can be configured with.
+
+    Search results are dicts with "content", "score" (higher is better) and
+    "metadata", best first.
+    """
+
+    @abstractmethod
+    def add_documents(self, chunks: List[str], metadata: List[Dict[str, Any]] = None):
+        """Add document chunks to the store"""
+
+    @abstractmethod
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Return the k chunks most similar to the query"""
+
+class Generator(ABC):
+    """Interface for the model that answers a question from retrieved passages"""
+
+    @abstractmethod
+    def generate(self, question: str, passages: List[Dict[str, Any]]) -> str:
+        """Answer the question using the passages"""
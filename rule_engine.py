@@ -0,0 +1,282 @@
+import re
+from typing import Dict, Any, List, Optional
+
+# Patterns are compiled once at import; extraction and evaluation never touch the model
+DURATION_RE = re.compile(r'(\d+)[\s-]*(day|week|month|year)s?', re.IGNORECASE)
+WAITING_RE = re.compile(r'waiting|\b(?:after|within the first|during the first)\s+\d+[\s-]*(?:day|week|month|year)', re.IGNORECASE)
+GENERAL_RE = re.compile(r'\b(?:any|all)\s+(?:medical\s+)?(?:expenses|illness(?:es)?|claims|treatments?)\b', re.IGNORECASE)
+SPECIFIED_RE = re.compile(r'related to|including|specified|such as', re.IGNORECASE)
+PRE_EXISTING_RE = re.compile(r'pre-?existing', re.IGNORECASE)
+NOT_COVERED_RE = re.compile(r'not covered|excluded', re.IGNORECASE)
+EXCEPTION_RE = re.compile(r'\b(?:unless|except)\b(.*)', re.IGNORECASE)
+AMOUNT_RE = re.compile(r'(?:₹|rs\.?|inr|\$)\s*([\d,]+)', re.IGNORECASE)
+LIMIT_RE = re.compile(r'maximum|limit|up to|capped', re.IGNORECASE)
+AGE_RANGE_RE = re.compile(r'aged?\s+(\d+)\s*(?:-|to)\s*(\d+)', re.IGNORECASE)
+# "over/above N" is only an age when it qualifies people, and never when N is a duration
+AGE_ABOVE_RE = re.compile(
+    r'\b(?:aged?|persons?|insured)\s+(?:above|over)\s+(\d+)\b(?![\s-]*(?:day|week|month)s?\b)', re.IGNORECASE
+)
+ENTRY_AGE_RE = re.compile(r'(minimum|maximum)\s+(?:entry\s+)?age\s+(?:of\s+|is\s+)?(\d+)', re.IGNORECASE)
+PERCENT_RE = re.compile(r'(\d+)\s*%')
+TIER_RE = re.compile(r'\btier[\s-]*(\d+)\b', re.IGNORECASE)
+FULL_COVERAGE_RE = re.compile(r'full coverage', re.IGNORECASE)
+CITY_RE = re.compile(r'\b[A-Z][a-z]+\b')
+SECTION_RE = re.compile(r'^\s*SECTION\b', re.IGNORECASE)
+SENTENCE_SPLIT_RE = re.compile(r'(?<=[.!?])\s+')
+WORD_RE = re.compile(r'[a-z]+')
+
+UNIT_DAYS = {"day": 1, "week": 7, "month": 30, "year": 365}
+
+# Capitalised words in a tier sentence that are not city names
+NON_CITY_WORDS = {"tier", "cities", "city", "the", "all", "and", "rural", "urban", "areas"}
+
+# Words that say nothing about which procedure a clause is about
+GENERIC_WORDS = {
+    "surgery", "surgeries", "operation", "operations", "procedure", "procedures",
+    "treatment", "treatments", "for", "and", "the", "of", "a", "an", "in", "on",
+    "required", "necessitated", "due", "to", "by", "with", "from"
+}
+
+class RuleEngine:
+    def extract_rules(self, text: str) -> List[Dict[str, Any]]:
+        """Extract numeric policy conditions from a chunk of text"""
+        rules = []
+        in_exclusions = False
+
+        for line in text.splitlines():
+            line = line.strip()
+            if not line:
+                continue
+
+            # Track whether we are inside an exclusions section
+            if SECTION_RE.match(line):
+                in_exclusions = "exclusion" in line.lower()
+                continue
+            if len(line) < 60 and "exclusion" in line.lower():
+                in_exclusions = True
+                continue
+
+            for sentence in SENTENCE_SPLIT_RE.split(line):
+                rules.extend(self._extract_sentence_rules(sentence, in_exclusions))
+
+        return rules
+
+    def _extract_sentence_rules(self, sentence: str, in_exclusions: bool) -> List[Dict[str, Any]]:
+        """Turn one sentence into zero or more rules"""
+        rules = []
+        scope, exceptions = self._split_exceptions(sentence)
+        durations = [int(v) * UNIT_DAYS[u.lower()] for v, u in DURATION_RE.findall(sentence)]
+
+        if durations and WAITING_RE.search(sentence):
+            rules.append({
+                "type": "waiting_period",
+                "days": max(durations),
+                "general": bool(GENERAL_RE.search(scope)) and not SPECIFIED_RE.search(scope),
+                "pre_existing": bool(PRE_EXISTING_RE.search(sentence)),
+                "scope": scope,
+                "exceptions": exceptions,
+                "text": sentence
+            })
+        elif in_exclusions or NOT_COVERED_RE.search(sentence):
+            rules.append({
+                "type": "exclusion",
+                "scope": scope,
+                "exceptions": exceptions,
+                "text": sentence
+            })
+
+        amount_match = AMOUNT_RE.search(sentence)
+        if amount_match and LIMIT_RE.search(sentence):
+            rules.append({
+                "type": "sub_limit",
+                "amount": float(amount_match.group(1).replace(',', '')),
+                "scope": scope,
+                "text": sentence
+            })
+
+        percent_match = PERCENT_RE.search(sentence)
+        range_match = AGE_RANGE_RE.search(sentence)
+        above_match = AGE_ABOVE_RE.search(sentence) if not range_match else None
+        if (range_match or above_match) and (percent_match or NOT_COVERED_RE.search(sentence)):
+            rules.append({
+                "type": "age_band",
+                "min": int(range_match.group(1)) if range_match else int(above_match.group(1)) + 1,
+                "max": int(range_match.group(2)) if range_match else None,
+                "percent": float(percent_match.group(1)) if percent_match else 0.0,
+                "text": sentence
+            })
+
+        tier_match = TIER_RE.search(sentence)
+        if tier_match:
+            # A tier sentence may give the tier's coverage, list its cities, or both
+            tier_percent = float(percent_match.group(1)) if percent_match else None
+            if tier_percent is None and FULL_COVERAGE_RE.search(sentence):
+                tier_percent = 100.0
+            cities = [c.lower() for c in CITY_RE.findall(sentence) if c.lower() not in NON_CITY_WORDS]
+            if tier_percent is not None or cities:
+                rules.append({
+                    "type": "location_tier",
+                    "tier": int(tier_match.group(1)),
+                    "cities": cities,
+                    "percent": tier_percent,
+                    "text": sentence
+                })
+
+        for bound, value in ENTRY_AGE_RE.findall(sentence):
+            rules.append({
+                "type": "age_limit",
+                "min": int(value) if bound.lower() == "minimum" else None,
+                "max": int(value) if bound.lower() == "maximum" else None,
+                "text": sentence
+            })
+
+        return rules
+
+    def evaluate(self, structured_query: Dict[str, Any], relevant_clauses: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Decide a claim from the rules attached to the retrieved clauses.
+
+        Returns None when the rules do not cover the case, so the caller can
+        escalate to the model.
+        """
+        age = self._to_int(structured_query.get("age"))
+        duration_days = self._duration_days(structured_query.get("policy_duration"))
+        procedure_words = self._content_words(str(structured_query.get("procedure") or ""))
+        query_text = " ".join(str(v) for v in structured_query.values() if isinstance(v, (str, int, float)))
+        query_words = set(WORD_RE.findall(query_text.lower()))
+
+        location = str(structured_query.get("location") or "").lower()
+
+        covered_by = []
+        sub_limit = None
+        age_percent = None
+        tier_percent = {}
+        city_tier = {}
+
+        for i, clause in enumerate(relevant_clauses):
+            clause_ref = f"Clause {i+1}"
+            for rule in clause.get("metadata", {}).get("rules", []):
+                rule_type = rule["type"]
+
+                if rule_type == "exclusion":
+                    if self._matches(procedure_words, rule["scope"]) and not self._excepted(rule, query_words):
+                        return self._decision("rejected", None, f"Excluded by policy: {rule['text']}", [clause_ref])
+
+                elif rule_type == "waiting_period":
+                    if rule["pre_existing"] or duration_days is None or self._excepted(rule, query_words):
+                        continue
+                    specific = self._matches(procedure_words, rule["scope"])
+                    if not (rule["general"] or specific):
+                        continue
+                    if duration_days < rule["days"]:
+                        return self._decision(
+                            "rejected", None,
+                            f"Policy is {duration_days} days old, within the {rule['days']}-day waiting period: {rule['text']}",
+                            [clause_ref]
+                        )
+                    if specific:
+                        covered_by.append(clause_ref)
+
+                elif rule_type == "age_limit":
+                    # Entry-age limits apply to the age at which the policy was taken out
+                    if age is None or duration_days is None:
+                        continue
+                    entry_age = age - duration_days // 365
+                    if (rule["min"] is not None and entry_age < rule["min"]) or (rule["max"] is not None and entry_age > rule["max"]):
+                        return self._decision(
+                            "rejected", None, f"Entry age {entry_age} is outside policy limits: {rule['text']}", [clause_ref]
+                        )
+
+                elif rule_type == "age_band":
+                    if age is None or age < rule["min"] or (rule["max"] is not None and age > rule["max"]):
+                        continue
+                    if rule["percent"] == 0:
+                        return self._decision("rejected", None, f"Age {age} is not covered: {rule['text']}", [clause_ref])
+                    age_percent = rule["percent"]
+
+                elif rule_type == "location_tier":
+                    if rule["percent"] is not None:
+                        tier_percent[rule["tier"]] = rule["percent"]
+                    for city in rule["cities"]:
+                        city_tier[city] = rule["tier"]
+
+                elif rule_type == "sub_limit":
+                    if self._matches(procedure_words, rule["scope"]):
+                        sub_limit = rule["amount"]
+                        covered_by.append(clause_ref)
+
+        # Only approve when a procedure-specific rule was checked and satisfied
+        if not covered_by or duration_days is None:
+            return None
+
+        amount = sub_limit
+        justification = "All applicable waiting periods, age limits and exclusions are satisfied."
+        if amount is not None and age_percent is not None:
+            amount = amount * age_percent / 100
+        if amount is not None and any(p < 100 for p in tier_percent.values()):
+            # Coverage depends on the city tier; without a tier for this location the amount is unknown
+            tier = city_tier.get(location)
+            if tier in tier_percent:
+                amount = amount * tier_percent[tier] / 100
+            else:
+                amount = None
+                justification += " The payable amount depends on the location tier, which could not be determined."
+        if amount is not None:
+            justification += f" Payable amount is {amount:g}."
+        return self._decision("approved", amount, justification, sorted(set(covered_by)))
+
+    def _decision(self, decision: str, amount: Optional[float], justification: str, clause_refs: List[str]) -> Dict[str, Any]:
+        return {
+            "decision": decision,
+            "amount": amount,
+            "justification": justification,
+            "clause_references": clause_refs,
+            "decision_source": "rules"
+        }
+
+    def _split_exceptions(self, sentence: str):
+        """Split a sentence into the part it applies to and its exception words"""
+        exception_match = EXCEPTION_RE.search(sentence)
+        if not exception_match:
+            return sentence.lower(), []
+        scope = sentence[:exception_match.start()].lower()
+        return scope, sorted(self._content_words(exception_match.group(1)))
+
+    def _content_words(self, text: str) -> set:
+        return {w for w in WORD_RE.findall(text.lower()) if len(w) > 2 and w not in GENERIC_WORDS}
+
+    def _stem(self, word: str) -> str:
+        """Reduce a plural word to its singular, e.g. knees -> knee, surgeries -> surgery"""
+        if word.endswith("ies") and len(word) > 4:
+            return word[:-3] + "y"
+        if word.endswith("s") and not word.endswith("ss") and len(word) > 3:
+            return word[:-1]
+        return word
+
+    def _matches(self, procedure_words: set, scope: str) -> bool:
+        """A rule applies when every specific word of the procedure is a word of its scope"""
+        scope_stems = {self._stem(w) for w in WORD_RE.findall(scope)}
+        return bool(procedure_words) and all(self._stem(w) in scope_stems for w in procedure_words)
+
+    def _excepted(self, rule: Dict[str, Any], query_words: set) -> bool:
+        # Compare word prefixes so "accident" matches "accidental"
+        return any(q.startswith(w[:6]) for w in rule.get("exceptions", []) for q in query_words)
+
+    def _to_int(self, value: Any) -> Optional[int]:
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _duration_days(self, policy_duration: Any) -> Optional[int]:
+        """Convert QueryParser's policy_duration (dict or free text) to days"""
+        if isinstance(policy_duration, dict):
+            value = self._to_int(policy_duration.get("value"))
+            unit = str(policy_duration.get("unit", "")).lower().rstrip("s")
+            if value is None or unit not in UNIT_DAYS:
+                return None
+            return value * UNIT_DAYS[unit]
+        if isinstance(policy_duration, str):
+            duration_match = DURATION_RE.search(policy_duration)
+            if duration_match:
+                return int(duration_match.group(1)) * UNIT_DAYS[duration_match.group(2).lower()]
+        return None
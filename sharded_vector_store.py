@@ -0,0 +1,219 @@
+import os
+import sys
+import json
+import heapq
+import zlib
+import threading
+import subprocess
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+from typing import List, Dict, Any, Optional
+import numpy as np
+import faiss
+
+from encoders import create_encoder, PrecomputedEncoder
+from vector_store import VectorStore
+from retrieval import Retriever
+
+# Methods a shard worker process will run on behalf of its client
+RPC_METHODS = {"add_embeddings", "search_vector", "memory_report", "save", "__len__"}
+
+class RemoteShard:
+    """A VectorStore shard running in its own worker process, reached over a local RPC connection"""
+
+    def __init__(self, dimension: int, store_kwargs: Dict[str, Any], directory: Optional[str] = None):
+        authkey = os.urandom(16)
+        command = [sys.executable, "-m", "sharded_vector_store", "--dimension", str(dimension),
+                   "--store-kwargs", json.dumps(store_kwargs)]
+        if directory is not None:
+            command += ["--load", directory]
+
+        # A fresh interpreter keeps the worker from re-importing the app and its models
+        self.process = subprocess.Popen(
+            command,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env={**os.environ, "SHARD_AUTHKEY": authkey.hex()},
+            stdout=subprocess.PIPE,
+            text=True
+        )
+        line = self.process.stdout.readline()
+        if not line:
+            raise RuntimeError(f"Shard worker exited with code {self.process.wait()} before it started listening")
+        address = json.loads(line)
+        self.conn = Client(tuple(address), authkey=authkey)
+        self.lock = threading.Lock()
+
+    def _call(self, method: str, *args):
+        with self.lock:
+            self.conn.send((method, args))
+            status, result = self.conn.recv()
+        if status == "error":
+            raise RuntimeError(f"Shard worker failed in {method}: {result}")
+        return result
+
+    def add_embeddings(self, embeddings: np.ndarray, chunks: List[str], metadata: List[Dict[str, Any]]):
+        return self._call("add_embeddings", embeddings, chunks, metadata)
+
+    def search_vector(self, query_vector: np.ndarray, k: int = 5) -> List[Dict[str, Any]]:
+        return self._call("search_vector", query_vector, k)
+
+    def memory_report(self) -> Dict[str, Any]:
+        return self._call("memory_report")
+
+    def save(self, directory: str):
+        return self._call("save", directory)
+
+    def __len__(self) -> int:
+        return self._call("__len__")
+
+    def close(self):
+        """Stop the worker process"""
+        with self.lock:
+            self.conn.close()
+        self.process.wait()
+
+def serve_shard(dimension: int, store_kwargs: Dict[str, Any], directory: Optional[str] = None):
+    """Run one shard and answer RPC calls from its client until it disconnects"""
+    encoder = PrecomputedEncoder(dimension)
+    if directory is not None:
+        store = VectorStore.load(directory, encoder=encoder, **store_kwargs)
+    else:
+        store = VectorStore(encoder=encoder, **store_kwargs)
+
+    listener = Listener(("127.0.0.1", 0), authkey=bytes.fromhex(os.environ["SHARD_AUTHKEY"]))
+    print(json.dumps(listener.address), flush=True)
+    # Nobody reads the pipe after the handshake, so keep later output off it
+    sys.stdout = sys.stderr
+    conn = listener.accept()
+
+    while True:
+        try:
+            method, args = conn.recv()
+        except EOFError:
+            break
+        if method not in RPC_METHODS:
+            conn.send(("error", f"Unknown method: {method}"))
+            continue
+        try:
+            conn.send(("ok", getattr(store, method)(*args)))
+        except Exception as e:
+            conn.send(("error", repr(e)))
+
+    listener.close()
+    store.close()
+
+class ShardedVectorStore(Retriever):
+    def __init__(self, n_shards: int = 4, partition: str = "document", processes: bool = False,
+                 model_name: str = "all-MiniLM-L6-v2", backend: str = "torch", batch_size: int = 32,
+                 directory: Optional[str] = None, **store_kwargs):
+        """Split the corpus across n_shards VectorStores and search them in parallel
+
+        partition="document" keeps every chunk of a document on the same shard,
+        partition="hash" spreads chunks by a hash of their text. Shards live in this
+        process (searched from threads; FAISS releases the GIL) or, with processes=True,
+        each in its own worker process. store_kwargs (index_type, rescore_k, ...) are
+        passed to every shard.
+        """
+        if partition not in ("document", "hash"):
+            raise ValueError(f"Unsupported partition: {partition}")
+        self.n_shards = n_shards
+        self.partition = partition
+        self.processes = processes
+        self.batch_size = batch_size
+        self.model = create_encoder(model_name, backend)
+        self.dimension = self.model.get_sentence_embedding_dimension()
+        self.executor = ThreadPoolExecutor(max_workers=n_shards)
+
+        shard_dirs = [None] * n_shards
+        if directory is not None:
+            shard_dirs = [os.path.join(directory, f"shard_{i}") for i in range(n_shards)]
+
+        if processes:
+            self.shards = [RemoteShard(self.dimension, store_kwargs, d) for d in shard_dirs]
+        else:
+            encoder = PrecomputedEncoder(self.dimension)
+            self.shards = [
+                VectorStore.load(d, encoder=encoder, **store_kwargs) if d else VectorStore(encoder=encoder, **store_kwargs)
+                for d in shard_dirs
+            ]
+
+    def _shard_for(self, chunk: str, metadata: Dict[str, Any]) -> int:
+        # crc32 rather than hash() so placement is stable across processes and restarts
+        if self.partition == "document":
+            key = str(metadata.get("document_name", chunk))
+        else:
+            key = chunk
+        return zlib.crc32(key.encode("utf-8")) % self.n_shards
+
+    def add_documents(self, chunks: List[str], metadata: List[Dict[str, Any]] = None):
+        """Encode chunks once and add each to its shard"""
+        if metadata is None:
+            metadata = [{}] * len(chunks)
+
+        embeddings = self.model.encode(chunks, batch_size=self.batch_size)
+        faiss.normalize_L2(embeddings)
+
+        groups = {}
+        for i, (chunk, meta) in enumerate(zip(chunks, metadata)):
+            groups.setdefault(self._shard_for(chunk, meta), []).append(i)
+
+        futures = [
+            self.executor.submit(
+                self.shards[shard].add_embeddings,
+                embeddings[idx],
+                [chunks[i] for i in idx],
+                [metadata[i] for i in idx]
+            )
+            for shard, idx in groups.items()
+        ]
+        for future in futures:
+            future.result()
+
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        """Fan the query out to every shard and merge the top k"""
+        query_vector = self.model.encode([query])
+        faiss.normalize_L2(query_vector)
+
+        futures = [self.executor.submit(shard.search_vector, query_vector, k) for shard in self.shards]
+        results = [r for future in futures for r in future.result()]
+
+        return heapq.nlargest(k, results, key=lambda r: r["score"])
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Per-shard memory reports"""
+        return {
+            "shards": self.n_shards,
+            "partition": self.partition,
+            "processes": self.processes,
+            "shard_reports": [shard.memory_report() for shard in self.shards]
+        }
+
+    def save(self, directory: str):
+        """Save every shard to its own subdirectory"""
+        os.makedirs(directory, exist_ok=True)
+        for i, shard in enumerate(self.shards):
+            shard.save(os.path.join(directory, f"shard_{i}"))
+
+    @classmethod
+    def load(cls, directory: str, n_shards: int = 4, **kwargs):
+        """Load a sharded store saved with save()"""
+        return cls(n_shards=n_shards, directory=directory, **kwargs)
+
+    def close(self):
+        """Stop shard worker processes and remove the shards' working files"""
+        self.executor.shutdown()
+        for shard in self.shards:
+            shard.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a VectorStore shard worker")
+    parser.add_argument("--dimension", type=int, required=True)
+    parser.add_argument("--store-kwargs", default="{}")
+    parser.add_argument("--load", default=None)
+    args = parser.parse_args()
+
+    serve_shard(args.dimension, json.loads(args.store_kwargs), args.load)
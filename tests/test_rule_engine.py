@@ -0,0 +1,118 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rule_engine import RuleEngine
+
+SAMPLE_POLICY = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_policy.txt")
+
+@pytest.fixture(scope="module")
+def engine():
+    return RuleEngine()
+
+@pytest.fixture(scope="module")
+def clauses(engine):
+    """One retrieved clause per rule extracted from the sample policy"""
+    with open(SAMPLE_POLICY) as f:
+        rules = engine.extract_rules(f.read())
+    return [{"content": rule["text"], "metadata": {"rules": [rule]}} for rule in rules]
+
+def query(procedure, months, age=46):
+    return {
+        "age": age,
+        "gender": "male",
+        "procedure": procedure,
+        "location": "Pune",
+        "policy_duration": {"value": months, "unit": "months"}
+    }
+
+def test_knee_surgery_within_waiting_period_is_rejected(engine, clauses):
+    result = engine.evaluate(query("knee surgery", 2), clauses)
+    assert result["decision"] == "rejected"
+    assert "90-day waiting period" in result["justification"]
+
+def test_knee_surgery_after_waiting_period_is_approved_with_age_band(engine, clauses):
+    result = engine.evaluate(query("knee surgery", 3), clauses)
+    assert result["decision"] == "approved"
+    assert result["amount"] == 22500
+    assert result["decision_source"] == "rules"
+
+def test_age_band_above(engine, clauses):
+    result = engine.evaluate(query("knee surgery", 6, age=75), clauses)
+    assert result["decision"] == "approved"
+    assert result["amount"] == 17500
+
+def test_ear_surgery_is_not_excluded_by_nuclear(engine, clauses):
+    assert engine.evaluate(query("ear surgery", 6), clauses) is None
+
+def test_exclusion_applies(engine, clauses):
+    result = engine.evaluate(query("cosmetic surgery", 12), clauses)
+    assert result["decision"] == "rejected"
+    assert "Cosmetic" in result["justification"]
+
+def test_exclusion_exception_words(engine, clauses):
+    result = engine.evaluate(query("cosmetic surgery", 12) | {"cause": "accidental injury"}, clauses)
+    assert result is None
+
+def test_general_waiting_period_exception(engine, clauses):
+    assert engine.evaluate(query("appendix surgery", 0) | {"cause": "accident"}, clauses) is None
+    result = engine.evaluate(query("appendix surgery", 0), clauses)
+    assert result["decision"] == "rejected"
+    assert "30-day" in result["justification"]
+
+def test_age_bands_extracted(engine):
+    bands = [r for r in engine.extract_rules(
+        "Persons aged 46-60: 90% of eligible coverage amount.\n"
+        "Persons above 70: 70% of eligible coverage amount."
+    ) if r["type"] == "age_band"]
+    assert [(b["min"], b["max"], b["percent"]) for b in bands] == [(46, 60, 90.0), (71, None, 70.0)]
+
+@pytest.mark.parametrize("sentence", [
+    "Hospitalisation over 30 days is not covered.",
+    "Ambulance charges above 2000 are reimbursed at 50%.",
+    "Insured persons over 30 days in hospital are not covered."
+])
+def test_over_above_amounts_are_not_age_bands(engine, sentence):
+    assert not [r for r in engine.extract_rules(sentence) if r["type"] == "age_band"]
+
+@pytest.mark.parametrize("procedure, scope", [
+    ("ear", "expenses arising from war, terrorism, or nuclear contamination."),
+    ("arm", "self-inflicted harm."),
+    ("hip", "claims during the first year of membership.")
+])
+def test_procedure_words_match_whole_words(engine, procedure, scope):
+    assert not engine._matches({procedure}, scope)
+
+def test_procedure_words_match_plurals(engine):
+    assert engine._matches({"knee"}, "knee surgeries are covered after 90 days")
+    assert engine._matches({"hip"}, "knee surgeries, hip replacements, and cardiac procedures")
+
+def entry_age_clauses(engine):
+    rules = engine.extract_rules("Maximum entry age is 65 years.")
+    return [{"content": rule["text"], "metadata": {"rules": rules}} for rule in rules]
+
+def test_entry_age_uses_age_at_policy_start(engine):
+    clauses = entry_age_clauses(engine)
+    assert engine.evaluate(query("knee surgery", 120, age=70), clauses) is None
+    result = engine.evaluate(query("knee surgery", 24, age=70), clauses)
+    assert result["decision"] == "rejected"
+    assert "Entry age 69" in result["justification"]
+
+def test_entry_age_without_policy_duration_is_left_to_the_model(engine):
+    clauses = entry_age_clauses(engine)
+    assert engine.evaluate(query("knee surgery", 12, age=70) | {"policy_duration": None}, clauses) is None
+
+def test_location_tier_percentage_applies(engine, clauses):
+    tier_2 = engine.extract_rules("Nagpur and Nashik are designated as Tier-2 cities.")
+    tier_2_clauses = clauses + [{"content": rule["text"], "metadata": {"rules": [rule]}} for rule in tier_2]
+    result = engine.evaluate(query("knee surgery", 3) | {"location": "Nagpur"}, tier_2_clauses)
+    assert result["decision"] == "approved"
+    assert result["amount"] == 18000
+
+def test_unplaced_location_leaves_amount_unknown(engine, clauses):
+    result = engine.evaluate(query("knee surgery", 3) | {"location": None}, clauses)
+    assert result["decision"] == "approved"
+    assert result["amount"] is None
+    assert "location tier" in result["justification"]
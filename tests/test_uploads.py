@@ -0,0 +1,82 @@
+import os
+import sys
+import asyncio
+import hashlib
+
+import pytest
+
+pytest.importorskip("multipart")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from uploads import save_multipart_upload, UploadTooLarge
+
+BOUNDARY = b"test-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY.decode()}"
+
+def file_part(name, filename, data):
+    return (b"--" + BOUNDARY + b"\r\n"
+            + f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'.encode()
+            + b"Content-Type: application/octet-stream\r\n\r\n" + data + b"\r\n")
+
+def field_part(name, value):
+    return (b"--" + BOUNDARY + b"\r\n"
+            + f'Content-Disposition: form-data; name="{name}"\r\n\r\n'.encode() + value + b"\r\n")
+
+def body(*parts):
+    return b"".join(parts) + b"--" + BOUNDARY + b"--\r\n"
+
+async def chunked(data, chunk_size):
+    for i in range(0, len(data), chunk_size):
+        yield data[i:i + chunk_size]
+    # Starlette's request.stream() ends with an empty chunk
+    yield b""
+
+def upload(data, chunk_size=64 * 1024, **kwargs):
+    return asyncio.run(save_multipart_upload(chunked(data, chunk_size), CONTENT_TYPE, **kwargs))
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024 * 1024])
+def test_file_is_written_hashed_and_sized(tmp_path, chunk_size):
+    payload = os.urandom(1000 if chunk_size == 1 else 300_000)
+    path, sha256, size, filename, fields = upload(
+        body(file_part("file", "policy.pdf", payload), field_part("metadata", b'{"a": 1}')),
+        chunk_size=chunk_size, directory=str(tmp_path)
+    )
+    with open(path, "rb") as f:
+        assert f.read() == payload
+    assert sha256 == hashlib.sha256(payload).hexdigest()
+    assert size == len(payload)
+    assert filename == "policy.pdf"
+    assert path.endswith(".pdf")
+    assert fields == {"metadata": '{"a": 1}'}
+
+def test_over_limit_raises_and_removes_temp_file(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        upload(body(file_part("file", "big.pdf", os.urandom(10_001))), directory=str(tmp_path), max_bytes=10_000)
+    assert os.listdir(tmp_path) == []
+
+def test_oversized_field_raises_and_removes_temp_file(tmp_path):
+    with pytest.raises(UploadTooLarge):
+        upload(
+            body(file_part("file", "policy.pdf", b"data"), field_part("metadata", b"x" * 101)),
+            directory=str(tmp_path), max_field_bytes=100
+        )
+    assert os.listdir(tmp_path) == []
+
+def test_missing_file_part_raises(tmp_path):
+    with pytest.raises(ValueError):
+        upload(body(field_part("metadata", b"{}")), directory=str(tmp_path))
+    assert os.listdir(tmp_path) == []
+
+def test_not_multipart_raises():
+    with pytest.raises(ValueError):
+        asyncio.run(save_multipart_upload(chunked(b"{}", 2), "application/json"))
+
+def test_only_first_file_part_is_kept(tmp_path):
+    path, _, size, filename, fields = upload(
+        body(file_part("file", "first.pdf", b"first"), file_part("file", "second.pdf", os.urandom(200))),
+        directory=str(tmp_path), max_field_bytes=100
+    )
+    with open(path, "rb") as f:
+        assert f.read() == b"first"
+    assert (size, filename, fields) == (5, "first.pdf", {})
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
@@ -0,0 +1,155 @@
+import os
+import hashlib
+import tempfile
+from typing import AsyncIterator, Callable, Dict, Optional, Tuple
+from multipart.multipart import MultipartParser, parse_options_header
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MiB
+MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+# Limit for each non-file form field, which is held in memory
+MAX_FIELD_BYTES = 64 * 1024
+
+class UploadTooLarge(Exception):
+    pass
+
+class UploadWriter:
+    """Writes an upload to a temp file chunk by chunk, hashing and size-checking as it goes
+
+    It is file-like enough to be handed to a multipart parser as the part's stream.
+    """
+
+    def __init__(self, suffix: str, directory: Optional[str], max_bytes: int):
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(suffix=suffix, dir=directory)
+        self.file = os.fdopen(fd, "w+b")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.max_bytes = max_bytes
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise UploadTooLarge(f"Upload exceeds the {self.max_bytes} byte limit")
+        self.sha256.update(chunk)
+        self.file.write(chunk)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self.file.seek(offset, whence)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+    def close(self):
+        self.file.close()
+
+    def finish(self) -> Tuple[str, str, int]:
+        self.file.close()
+        return self.path, self.sha256.hexdigest(), self.size
+
+    def discard(self):
+        """Close and delete the temp file; safe to call more than once"""
+        self.file.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+class _MultipartUpload:
+    """python-multipart callbacks that send one file field to an UploadWriter and collect the other fields
+
+    Only the first file_field file is kept; any other file parts are read and discarded.
+    """
+
+    def __init__(self, file_field: str, directory: Optional[str], max_bytes: int, max_field_bytes: int):
+        self.file_field = file_field
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_field_bytes = max_field_bytes
+        self.writer = None
+        self.filename = None
+        self.fields = {}
+        self._headers = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._part_name = ""
+        self._part_target = None  # "file", "field" or "skip"
+        self._part_value = None
+
+    def callbacks(self) -> Dict[str, Callable]:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end
+        }
+
+    def on_part_begin(self):
+        self._headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        self._part_name = options.get(b"name", b"").decode("utf-8")
+        filename = options.get(b"filename")
+        if filename is None:
+            self._part_target = "field"
+            self._part_value = bytearray()
+        elif self._part_name == self.file_field and self.writer is None:
+            self._part_target = "file"
+            self.filename = filename.decode("utf-8")
+            self.writer = UploadWriter(os.path.splitext(self.filename)[1], self.directory, self.max_bytes)
+        else:
+            self._part_target = "skip"
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self._part_target == "file":
+            self.writer.write(data[start:end])
+        elif self._part_target == "field":
+            self._part_value += data[start:end]
+            if len(self._part_value) > self.max_field_bytes:
+                raise UploadTooLarge(f"Form field {self._part_name!r} exceeds the {self.max_field_bytes} byte limit")
+
+    def on_part_end(self):
+        if self._part_target == "field":
+            self.fields[self._part_name] = self._part_value.decode("utf-8", errors="replace")
+
+async def save_multipart_upload(stream: AsyncIterator[bytes], content_type: str, file_field: str = "file",
+                                directory: Optional[str] = None, max_bytes: int = MAX_UPLOAD_BYTES,
+                                max_field_bytes: int = MAX_FIELD_BYTES) -> Tuple[str, str, int, str, Dict[str, str]]:
+    """Parse a multipart/form-data body as it arrives, e.g. from a Starlette request.stream()
+
+    The file_field part is hashed, size-checked and written to a temp file chunk by
+    chunk, so it is never spooled first. Returns (path, sha256, size, filename,
+    other_fields).
+    """
+    mime_type, options = parse_options_header(content_type)
+    if mime_type != b"multipart/form-data" or b"boundary" not in options:
+        raise ValueError("Expected a multipart/form-data body")
+
+    upload = _MultipartUpload(file_field, directory, max_bytes, max_field_bytes)
+    parser = MultipartParser(options[b"boundary"], upload.callbacks())
+    try:
+        async for chunk in stream:
+            parser.write(chunk)
+        parser.finalize()
+        if upload.writer is None:
+            raise ValueError(f"No {file_field!r} file in the upload")
+    except BaseException:
+        if upload.writer is not None:
+            upload.writer.discard()
+        raise
+
+    path, sha256, size = upload.writer.finish()
+    return path, sha256, size, upload.filename, upload.fields
@@ -1,33 +1,119 @@
 import os
-from typing import List, Dict, Any
+import shutil
+import sys
+import tempfile
+import weakref
+from typing import List, Dict, Any, Optional
 import numpy as np
-from sentence_transformers import SentenceTransformer
 import faiss  # For vector search
 
-class VectorStore:
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
-        """Initialize the vector store with an embedding model"""
-        self.model = SentenceTransformer(model_name)
+from encoders import create_encoder, TorchEncoder
+from retrieval import Retriever
+
+INDEX_TYPES = ("flat", "fp16", "sq8", "pq")
+# Vectors to collect before training: FAISS wants ~39 per centroid, and PQ has 256 per sub-quantizer
+DEFAULT_TRAIN_SIZE = {"sq8": 1000, "pq": 256 * 39}
+
+class VectorStore(Retriever):
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", backend: str = "torch",
+                 batch_size: int = 32, verify: bool = False, index_type: str = "flat",
+                 pq_m: int = 48, train_size: Optional[int] = None, rescore_k: int = 0,
+                 vectors_path: Optional[str] = None, encoder=None):
+        """Initialize the vector store with an embedding model
+
+        backend selects the encoder ("torch", "torch-int8", "onnx", "onnx-int8").
+        With verify=True every ingested batch is also encoded by the fp32 reference
+        model and the cosine drift is reported in last_drift_report.
+
+        index_type selects how vectors are held in memory: "flat" (float32), "fp16"
+        or "sq8" scalar quantization, or "pq" product quantization with pq_m bytes
+        per vector. sq8 and pq are trained once train_size vectors have arrived
+        (by default DEFAULT_TRAIN_SIZE for the index type);
+        until then the pending vectors are searched exactly. With rescore_k > 0 the
+        float32 vectors are appended to vectors_path on disk and the top rescore_k
+        candidates of every search are re-scored exactly from there.
+
+        An existing encoder can be shared instead of loading model_name again.
+        """
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.verify = verify
+        self.model = encoder if encoder is not None else create_encoder(model_name, backend)
+        self.reference_model = None
+        self.last_drift_report = None
         self.dimension = self.model.get_sentence_embedding_dimension()
+        if index_type == "pq" and self.dimension % pq_m != 0:
+            raise ValueError(f"pq_m={pq_m} must divide the embedding dimension {self.dimension}")
+        self.index_type = index_type
+        self.pq_m = pq_m
+        self.train_size = train_size if train_size is not None else DEFAULT_TRAIN_SIZE.get(index_type, 1000)
+        self.rescore_k = rescore_k
+        self.vectors_path = vectors_path
+        self._remove_vectors = None
+        if rescore_k > 0 and vectors_path is None:
+            # A working file owned by this store, removed by close() or when the store is collected
+            fd, self.vectors_path = tempfile.mkstemp(suffix=".f32")
+            os.close(fd)
+            self._remove_vectors = weakref.finalize(self, _remove_file, self.vectors_path)
+        self.pending = np.empty((0, self.dimension), dtype=np.float32)
         self.index = None
         self.texts = []
         self.metadata = []
-        
+
+    def close(self):
+        """Remove the re-scoring vectors file if this store created it"""
+        if self._remove_vectors is not None:
+            self._remove_vectors()
+
+    def _create_index(self):
+        """Create an empty FAISS index of the configured type"""
+        if self.index_type == "fp16":
+            return faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_fp16)
+        elif self.index_type == "sq8":
+            return faiss.IndexScalarQuantizer(self.dimension, faiss.ScalarQuantizer.QT_8bit)
+        elif self.index_type == "pq":
+            return faiss.IndexPQ(self.dimension, self.pq_m, 8)
+        return faiss.IndexFlatL2(self.dimension)
+
     def add_documents(self, chunks: List[str], metadata: List[Dict[str, Any]] = None):
         """Add document chunks to the vector store"""
         if metadata is None:
             metadata = [{}] * len(chunks)
             
         # Generate embeddings for all chunks
-        embeddings = self.model.encode(chunks)
-        
+        embeddings = self.model.encode(chunks, batch_size=self.batch_size)
+        if self.verify:
+            self.last_drift_report = self._drift_report(chunks, embeddings)
+            print(f"Encoder drift ({self.backend} vs fp32): {self.last_drift_report}")
+
+        faiss.normalize_L2(embeddings)
+        self.add_embeddings(embeddings, chunks, metadata)
+
+    def add_embeddings(self, embeddings: np.ndarray, chunks: List[str], metadata: List[Dict[str, Any]]):
+        """Add already normalised embeddings with their chunks and metadata"""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
         # Initialize FAISS index if not already done
         if self.index is None:
-            self.index = faiss.IndexFlatL2(self.dimension)
-            
-        # Add to FAISS index
-        faiss.normalize_L2(embeddings)
-        self.index.add(embeddings)
+            self.index = self._create_index()
+
+        # Keep full-precision vectors on disk for exact re-scoring
+        if self.rescore_k > 0:
+            with open(self.vectors_path, "ab") as f:
+                f.write(embeddings.tobytes())
+
+        # Add to FAISS index, holding vectors back until a quantizer has enough to train on
+        if self.index.is_trained:
+            self.index.add(embeddings)
+        else:
+            self.pending = np.vstack([self.pending, embeddings])
+            if len(self.pending) >= self.train_size:
+                self.index.train(self.pending)
+                self.index.add(self.pending)
+                self.pending = np.empty((0, self.dimension), dtype=np.float32)
         
         # Store the original texts and metadata
         self.texts.extend(chunks)
@@ -35,53 +121,194 @@ class VectorStore:
     
     def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
         """Search for similar documents given a query string"""
-        if self.index is None or self.index.ntotal == 0:
+        if self.index is None or len(self.texts) == 0:
             return []
             
         # Encode the query
         query_vector = self.model.encode([query])
         faiss.normalize_L2(query_vector)
-        
+
+        return self.search_vector(query_vector, k)
+
+    def search_vector(self, query_vector: np.ndarray, k: int = 5) -> List[Dict[str, Any]]:
+        """Search with an already normalised (1, dimension) query vector"""
+        if self.index is None or len(self.texts) == 0:
+            return []
+
+        query_vector = np.ascontiguousarray(query_vector, dtype=np.float32)
+        n_candidates = max(k, self.rescore_k)
+        candidates = []
+
         # Search the index
-        distances, indices = self.index.search(query_vector, k)
-        
+        if self.index.ntotal > 0:
+            distances, indices = self.index.search(query_vector, n_candidates)
+            candidates.extend((float(d), int(idx)) for d, idx in zip(distances[0], indices[0]) if idx != -1)
+
+        # Vectors still waiting for quantizer training are searched exactly
+        if len(self.pending) > 0:
+            pending_distances = 2 - 2 * (self.pending @ query_vector[0])
+            for j in np.argsort(pending_distances)[:n_candidates]:
+                candidates.append((float(pending_distances[j]), self.index.ntotal + int(j)))
+
+        if self.rescore_k > 0:
+            candidates = self._rescore(query_vector[0], candidates)
+        candidates.sort()
+
         # Return results with scores and metadata
         results = []
-        for i, idx in enumerate(indices[0]):
-            if idx != -1:  # -1 indicates no match
-                results.append({
-                    "content": self.texts[idx],
-                    "score": float(1 - distances[0][i]),  # Convert to similarity score
-                    "metadata": self.metadata[idx]
-                })
+        for distance, idx in candidates[:k]:
+            results.append({
+                "content": self.texts[idx],
+                "score": float(1 - distance),  # Convert to similarity score
+                "metadata": self.metadata[idx]
+            })
                 
         return results
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def _rescore(self, query_vector: np.ndarray, candidates: List[tuple]) -> List[tuple]:
+        """Replace approximate distances with exact ones from the float32 vectors on disk"""
+        if not candidates:
+            return candidates
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(len(self.texts), self.dimension))
+        ids = [idx for _, idx in candidates]
+        exact = 2 - 2 * (vectors[ids] @ query_vector)
+        return list(zip(exact.tolist(), ids))
+
+    def memory_report(self) -> Dict[str, Any]:
+        """Report memory used by the index and texts, with estimates for every index type"""
+        n = len(self.texts)
+        code_bytes = {
+            "flat": self.dimension * 4,
+            "fp16": self.dimension * 2,
+            "sq8": self.dimension,
+            "pq": self.pq_m
+        }
+
+        return {
+            "index_type": self.index_type,
+            "vectors": n,
+            "index_bytes": self._index_bytes(),
+            "pending_bytes": int(self.pending.nbytes),
+            "texts_bytes": sys.getsizeof(self.texts) + sum(sys.getsizeof(t) for t in self.texts),
+            "rescore_vectors_on_disk_bytes": os.path.getsize(self.vectors_path) if self.rescore_k > 0 else 0,
+            "estimated_index_bytes": {t: n * b for t, b in code_bytes.items()}
+        }
+
+    def _index_bytes(self) -> int:
+        """Size of the index's codes and trained tables, without serializing it"""
+        if self.index is None:
+            return 0
+        codebook = 0
+        if self.index_type == "pq":
+            codebook = self.index.pq.centroids.size() * 4
+        elif self.index_type in ("fp16", "sq8"):
+            codebook = self.index.sq.trained.size() * 4
+        return int(self.index.sa_code_size() * self.index.ntotal + codebook)
+
+    def measure_drift(self, texts: List[str]) -> Dict[str, Any]:
+        """Report cosine drift of the configured backend against fp32 vectors"""
+        return self._drift_report(texts, self.model.encode(texts, batch_size=self.batch_size))
+
+    def _drift_report(self, texts: List[str], embeddings: np.ndarray) -> Dict[str, Any]:
+        if self.reference_model is None:
+            self.reference_model = self.model if self.backend == "torch" else TorchEncoder(self.model_name)
+        reference = self.reference_model.encode(texts, batch_size=self.batch_size)
+
+        a = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        b = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+        cosine = (a * b).sum(axis=1)
+
+        return {
+            "backend": self.backend,
+            "count": len(texts),
+            "mean_cosine": float(cosine.mean()),
+            "min_cosine": float(cosine.min()),
+            "max_drift": float(1 - cosine.min())
+        }
     
     def save(self, directory: str):
         """Save the vector store to disk"""
         os.makedirs(directory, exist_ok=True)
+        if self.index is None:
+            self.index = self._create_index()
         
         # Save the FAISS index
         faiss.write_index(self.index, os.path.join(directory, "index.faiss"))
         
+        # Keep the full-precision vectors next to the index
+        if self.rescore_k > 0:
+            vectors_path = os.path.join(directory, "vectors.f32")
+            if os.path.abspath(self.vectors_path) != os.path.abspath(vectors_path):
+                shutil.copyfile(self.vectors_path, vectors_path + ".tmp")
+                os.replace(vectors_path + ".tmp", vectors_path)
+
         # Save the texts and metadata
         import pickle
         with open(os.path.join(directory, "data.pkl"), "wb") as f:
-            pickle.dump({"texts": self.texts, "metadata": self.metadata}, f)
+            pickle.dump({"texts": self.texts, "metadata": self.metadata, "pending": self.pending}, f)
     
     @classmethod
-    def load(cls, directory: str, model_name: str = "all-MiniLM-L6-v2"):
-        """Load a vector store from disk"""
-        store = cls(model_name)
-        
+    def load(cls, directory: str, model_name: str = "all-MiniLM-L6-v2", backend: str = "torch", **kwargs):
+        """Load a vector store from disk
+
+        With rescore_k > 0 the saved float32 vectors are copied into the store's own
+        working file, so later additions never touch the saved state. Rows beyond the
+        saved texts (left by a crash before save) are dropped; rows that are missing
+        (e.g. the store was saved with rescore_k=0) are rebuilt from the index, which
+        is only approximate for quantized index types.
+        """
+        kwargs.pop("vectors_path", None)
+        store = cls(model_name, backend=backend, **kwargs)
+
         # Load the FAISS index
         store.index = faiss.read_index(os.path.join(directory, "index.faiss"))
-        
+
         # Load the texts and metadata
         import pickle
         with open(os.path.join(directory, "data.pkl"), "rb") as f:
             data = pickle.load(f)
             store.texts = data["texts"]
             store.metadata = data["metadata"]
-            
-        return store
\ No newline at end of file
+            store.pending = data.get("pending", store.pending)
+
+        if store.rescore_k > 0:
+            row_bytes = store.dimension * 4
+            saved_path = os.path.join(directory, "vectors.f32")
+            saved_rows = os.path.getsize(saved_path) // row_bytes if os.path.exists(saved_path) else 0
+            valid_rows = min(saved_rows, len(store.texts))
+            with open(store.vectors_path, "wb") as out:
+                if valid_rows:
+                    with open(saved_path, "rb") as f:
+                        _copy_bytes(f, out, valid_rows * row_bytes)
+            if valid_rows < len(store.texts):
+                store._rebuild_vectors(valid_rows)
+
+        return store
+
+    def _rebuild_vectors(self, start: int = 0):
+        """Append the float32 vectors from row start on, reconstructed from the index and pending vectors"""
+        if self.index_type != "flat":
+            print(f"Rebuilding {len(self.texts) - start} re-scoring vectors from the {self.index_type} index; "
+                  f"they are approximate")
+        with open(self.vectors_path, "ab") as f:
+            if start < self.index.ntotal:
+                f.write(self.index.reconstruct_n(start, self.index.ntotal - start).astype(np.float32).tobytes())
+            pending = self.pending[max(0, start - self.index.ntotal):]
+            f.write(np.ascontiguousarray(pending, dtype=np.float32).tobytes())
+
+def _copy_bytes(src, dst, n_bytes: int, chunk_size: int = 16 * 1024 * 1024):
+    while n_bytes > 0:
+        chunk = src.read(min(chunk_size, n_bytes))
+        if not chunk:
+            break
+        dst.write(chunk)
+        n_bytes -= len(chunk)
+
+def _remove_file(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass